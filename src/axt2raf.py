@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/env python3
 
 ###
 #@file axt2raf.py
@@ -26,14 +26,35 @@
 #    standard input. Input should be in axt format.
 #
 #    Writes to standard output.
+#
+#axt2raf.py requires numpy. It runs faster if numba is installed.
 
+import os
 import sys
 import datetime
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # External variables
 minlen = 1
 minqual = 0
 
+# Size of input buffer, in bytes
+BUFSIZE = 128*1024
+
+# Byte codes of characters in alignment strings
+DASH = ord("-")
+DOT = ord(".")
+NCHAR = ord("n")
+
+# Lookup table mapping each byte to its lower-case equivalent
+LOWER = np.arange(256, dtype=np.uint8)
+LOWER[ord("A"):ord("Z")+1] += ord("a") - ord("A")
+
 # Print usage message and abort
 def usage():
     msg = \
@@ -52,7 +73,7 @@ standard input. Input should be in axt format.
 Writes to standard output.
 """
     sys.stdout.flush()
-    print >> sys.stderr, msg
+    print(msg, file=sys.stderr)
     exit(1)
 
 class Alignment:
@@ -63,63 +84,60 @@ class Alignment:
         while True:
             # read until we get a non-blank line
             line=infile.readline()
-            if line == '':    # end of file
+            if line == b'':   # end of file
                 self.initialized = False
                 return self
             line = line.strip()
-            if len(line)==0 or line[0] == "#":  # blank line or comment
+            if len(line)==0 or line[0:1] == b"#":  # blank line or comment
                 continue
             break             # non-blank, non-comment
         line = line.split()
         sA=infile.readline()
         sB=infile.readline()
-        if sB == '':
+        if sB == b'':
             self.initialized = False # signal end of file
             self.reject = True
             return self
-        sA = sA.strip().lower()
-        sB = sB.strip().lower()
-        lenA = len(sA)
-        lenB = len(sB)
+        arrA = np.frombuffer(sA.strip(), dtype=np.uint8)
+        arrB = np.frombuffer(sB.strip(), dtype=np.uint8)
+        lenA = len(arrA)
+        lenB = len(arrB)
 
         self.alignment = int(line[0])
-        self.chr=line[1]
+        self.chr=line[1].decode()
         self.start = int(line[2]) # start position, seq A
         self.end = int(line[3])+1 # 1 past last position, seq A
 
         # lengths of seqA and seqB should match
         if lenA != lenB:
             sys.stdout.flush()
-            print >> sys.stderr, \
-                "length mismatch in alignment %d" \
-                % self.alignment
-            print >> sys.stderr, "lenA=%d but lenB=%d" \
-                % (lenA, lenB)
+            print("length mismatch in alignment %d" % self.alignment,
+                  file=sys.stderr)
+            print("lenA=%d but lenB=%d" % (lenA, lenB), file=sys.stderr)
             exit(1)
 
         # After omitting gaps, length of seqA should match header
         self.length = self.end - self.start
-        netA = lenA - sA.count("-")
+        mask = arrA != DASH
+        netA = np.count_nonzero(mask)
         if netA != self.length:
             sys.stdout.flush()
-            print >> sys.stderr, \
-                "non-gap length mismatch: seqA and header in alignment %d" \
-                % self.alignment
-            print >> sys.stderr, "header=%d but netA=%d" \
-                % (self.end - self.start, netA)
+            print("non-gap length mismatch: seqA and header in alignment %d" \
+                  % self.alignment, file=sys.stderr)
+            print("header=%d but netA=%d" % (self.end - self.start, netA),
+                  file=sys.stderr)
             exit(1)
 
         # After omitting gaps, length of seqB should match header
-        netB = lenB - sB.count("-")
+        netB = np.count_nonzero(arrB != DASH)
         startB = int(line[5])     # start, seq B
         endB = int(line[6])+1     # end, seq B
         if netB != endB - startB:
             sys.stdout.flush()
-            print >> sys.stderr, \
-                "non-gap length mismatch: seqB and header in alignment %d" \
-                % self.alignment
-            print >> sys.stderr, "header=%d but netB=%d" \
-                % (endB - startB, netA)
+            print("non-gap length mismatch: seqB and header in alignment %d" \
+                  % self.alignment, file=sys.stderr)
+            print("header=%d but netB=%d" % (endB - startB, netA),
+                  file=sys.stderr)
             exit(1)
 
         strand = line[7]
@@ -131,65 +149,63 @@ class Alignment:
         else:
             self.reject = False
 
-        # netA is length of output vectors
-        self.ref = netA * [None]
-        self.alt = netA * [None]
-        self.raf = netA * [None]
-
-        # i indexes ref, alt, and p
-        # j indexes sA and sB
-        i = j = 0
-        while i < netA:
-            if sA[j] != "-":
-                self.ref[i] = sA[j]
-                if sA[j] == sB[j]:
-                    self.alt[i] = "."
-                    self.raf[i] = 1.0
-                elif sB[j] == "-":
-                    self.alt[i] = "-" # deletion in sB
-                elif sB[j] == "n":
-                    self.alt[i] = sB[j]
-                else:
-                    self.alt[i] = sB[j]
-                    self.raf[i] = 0.0
-                i += 1
-            j += 1
+        # netA is length of output vectors. Rejected alignments are
+        # neither printed nor merged, so their vectors are left empty.
+        if self.reject:
+            self.ref = np.empty(0, dtype=np.uint8)
+            self.alt = np.empty(0, dtype=np.uint8)
+            self.raf = np.empty(0, dtype=np.float64)
+            self.nsites = 0
+        else:
+            self.ref, self.alt, self.raf = sites(arrA, arrB, mask, netA)
+            self.nsites = netA
 
         self.initialized = True
         return self
 
     # Print alignment
     def pr(self):
-        #print "# Alignment %d: [%d, %d) len=%d qual=%d" % \
-        #    (self.alignment, self.start, self.end, self.length, self.qual)
+        #print("# Alignment %d: [%d, %d) len=%d qual=%d" % \
+        #    (self.alignment, self.start, self.end, self.length, self.qual))
 
         # Filter
         if self.reject:
             self.initialized = False
             return self
 
-        pos = self.start
-        for i in range(len(self.ref)):
-            # omit deletions and missing values
-            if self.alt[i] not in "-n" and self.ref[i] not in "-n":
-                print "%s\t%d\t%s\t%s\t%f" % (self.chr, pos, self.ref[i],\
-                                                  self.alt[i], self.raf[i])
-            pos += 1
+        # Arrays may have spare capacity beyond nsites.
+        ref = self.ref[:self.nsites]
+        alt = self.alt[:self.nsites]
+        raf = self.raf[:self.nsites]
+
+        # omit deletions and missing values
+        keep = (alt != DASH) & (alt != NCHAR) & (ref != NCHAR)
+        idx = np.flatnonzero(keep)
+
+        # raf takes few distinct values, so format each of them once.
+        rafval, rafidx = np.unique(raf[idx], return_inverse=True)
+        rafstr = np.array(["%f" % x for x in rafval.tolist()])
+        rows = zip((self.start + idx).tolist(), ref[idx].tobytes().decode(),
+                   alt[idx].tobytes().decode(), rafstr[rafidx].tolist())
+
+        # Format the whole alignment, then write it all at once.
+        fmt = self.chr.replace("%", "%%") + "\t%d\t%s\t%s\t%s\n"
+        sys.stdout.write("".join(map(fmt.__mod__, rows)))
         self.initialized = False
         return self
 
     # Define "+=" operator, which merges two alignments
     def __iadd__(self, other):
         if not self.initialized:
-            raise ValueError, "lhs Alignment not initialized"
+            raise ValueError("lhs Alignment not initialized")
         if not other.initialized:
-            raise ValueError, "rhs Alignment not initialized"
+            raise ValueError("rhs Alignment not initialized")
         if self.chr != other.chr:
-            raise ValueError, "Chromosomes don't match"
+            raise ValueError("Chromosomes don't match")
         if self.start > other.start:
-            raise ValueError, "Start position of lhs exceeds rhs"
+            raise ValueError("Start position of lhs exceeds rhs")
         if other.start > self.end:
-            raise ValueError, "Alignments don't overlap"
+            raise ValueError("Alignments don't overlap")
         if other.start == self.end:
             self.s += other.s
             self.end = other.end
@@ -201,14 +217,79 @@ class Alignment:
         if self.reject:
             return other
         else:
+            # Keep the first n sites of self and append those of
+            # other. Arrays grow by doubling, so a chain of merges
+            # costs time linear in its total length.
             n = other.start - self.start
-            self.ref = self.ref[0:n] + other.ref
-            self.alt = self.alt[0:n] + other.alt
-            self.raf = self.raf[0:n] + other.raf
+            m = n + other.nsites
+            if m > len(self.ref):
+                size = max(m, 2*len(self.ref))
+                self.ref = grow(self.ref, size, n)
+                self.alt = grow(self.alt, size, n)
+                self.raf = grow(self.raf, size, n)
+            self.ref[n:m] = other.ref[:other.nsites]
+            self.alt[n:m] = other.alt[:other.nsites]
+            self.raf[n:m] = other.raf[:other.nsites]
+            self.nsites = m
         self.initialized = True
         other.initialized = False
         return self
 
+# Read the next alignment from infile. Return a new Alignment, or
+# None at end of file.
+def read_alignment(infile):
+    a = Alignment().read(infile)
+    if not a.initialized:
+        return None
+    return a
+
+# Return arrays ref, alt, and raf, each of length n, describing the
+# columns of alignment strings a and b in which mask is True, i.e.
+# in which a has no gap. Case is folded only in these columns. alt is
+# "." where b matches a, and raf is NaN where b has a gap or a missing
+# value.
+if njit == None:
+    def sites(a, b, mask, n):
+        ref = LOWER[a[mask]]
+        b = LOWER[b[mask]]
+        same = b == ref
+        alt = np.where(same, np.uint8(DOT), b)
+        raf = np.where(same, 1.0,
+                       np.where((b == DASH) | (b == NCHAR), np.nan, 0.0))
+        return ref, alt, raf
+else:
+    # Compiled version: a single pass over the columns.
+    @njit(cache=True)
+    def sites(a, b, mask, n):
+        ref = np.empty(n, dtype=np.uint8)
+        alt = np.empty(n, dtype=np.uint8)
+        raf = np.empty(n, dtype=np.float64)
+        i = 0
+        for j in range(a.shape[0]):
+            if not mask[j]:
+                continue
+            x = LOWER[a[j]]
+            y = LOWER[b[j]]
+            ref[i] = x
+            if x == y:
+                alt[i] = DOT
+                raf[i] = 1.0
+            else:
+                alt[i] = y
+                if y == DASH or y == NCHAR:
+                    raf[i] = np.nan
+                else:
+                    raf[i] = 0.0
+            i += 1
+        return ref, alt, raf
+
+# Return a new array of the given size, whose first n entries are
+# copied from arr.
+def grow(arr, size, n):
+    new = np.empty(size, dtype=arr.dtype)
+    new[:n] = arr[:n]
+    return new
+
 # Do two alignments overlap?
 def overlap(a, b):
     assert a.start <= b.start
@@ -236,39 +317,37 @@ while i < len(sys.argv):
         if f != sys.stdin:
             usage()
         try:
-            f=open(sys.argv[i])
+            f=open(sys.argv[i], "rb", BUFSIZE)
         except:
             sys.stdout.flush()
-            print >> sys.stderr, "Can't open input file \"%s\"" % sys.argv[i]
+            print("Can't open input file \"%s\"" % sys.argv[i],
+                  file=sys.stderr)
             exit(1)
     i += 1
 
-a = Alignment()
-b = Alignment()
+if f == sys.stdin:
+    f = os.fdopen(sys.stdin.fileno(), "rb", BUFSIZE)
 
-a.read(f)
-if a.initialized == False:
+a = read_alignment(f)
+if a == None:
     sys.stdout.flush()
-    print >> sys.stderr, "Can't read 1st alignment"
+    print("Can't read 1st alignment", file=sys.stderr)
     exit(1)
 
-print "#%s\t%s\t%s\t%s\t%s" % ("chr", "pos", "ref", "alt", "raf")
-while True:
-    b.read(f)
-    if b.initialized == False:
-        break
+print("#%s\t%s\t%s\t%s\t%s" % ("chr", "pos", "ref", "alt", "raf"))
+for b in iter(lambda: read_alignment(f), None):
     if a.chr > b.chr:
         # chromosomes missorted
         sys.stdout.flush()
-        print >> sys.stderr, \
-            "Chromosomes missorted: %s > %s" % (a.chr, b.chr)
+        print("Chromosomes missorted: %s > %s" % (a.chr, b.chr),
+              file=sys.stderr)
         exit(1)
     elif a.chr == b.chr:
         # same chromosome
         if a.start > b.start:
             sys.stdout.flush()
-            print >> sys.stderr, \
-                "Start positions missorted: %d > %d" % (a.start, b.start)
+            print("Start positions missorted: %d > %d" % (a.start, b.start),
+                  file=sys.stderr)
             exit(1)
         if overlap(a, b):
             # alignments overlap, so merge b into a; don't print
@@ -276,13 +355,10 @@ while True:
             continue
     # We get here in either of two cases: (1) same chromosome and
     # no overlap, or (2) new (correctly sorted) chromosome. Either
-    # way, we print the old alignment and then swap so that b becomes
-    # the old alignment, "a", on the next pass through the loop.
+    # way, we print the old alignment, and b becomes the old
+    # alignment, "a", on the next pass through the loop.
     a.pr()
-    a, b = b, a # swap a and b
+    a = b
 
 if a.initialized:
     a.pr()
-
-if b.initialized:
-    b.pr()
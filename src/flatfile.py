@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/env python3
 ###
 #@file flatfile.py
 #@page flatfile
@@ -41,6 +41,8 @@
 # <rogers@anthro.utah.edu>. This file is released under the Internet
 # Systems Consortium License, which can be found in file "LICENSE".
 
+import csv
+import re
 import sys
 from math import floor, ceil
 import datetime
@@ -48,7 +50,7 @@ import datetime
 # Print usage message and abort
 def usage(msg1):
     if len(msg1) > 0:
-        print >> sys.stderr, msg1
+        print(msg1, file=sys.stderr)
     msg = \
         """
 usage: flatfile.py [options] <file1> <file2> ...
@@ -61,40 +63,41 @@ Options may include:
 
 The program writes to standard output.
 """
-    print >> sys.stderr, msg
+    print(msg, file=sys.stderr)
     exit(1)
 
+# Matches a line that does not begin with "#" and contains exactly
+# one "=". Groups are the text to the left and right of "=". The
+# first character is tested on its own, so comment and blank lines
+# are rejected after one byte.
+assignment = re.compile(r"^([^#=\n][^=\n]*)?=([^=\n]*)$", re.MULTILINE)
+
 # Parse legofit output file.  Return a map relating parameter names to
 # estimated parameter values.
 def parselegofit(fname):
     ifile = open(fname, "r")
-    parmap = {}
-    estmap = {}
+    text = ifile.read()
+    ifile.close()
 
-    for line in ifile:
-        if line[0] == "#":
-            continue
-        line = line.split("=")
-        if len(line) != 2:
-            continue
+    seen = set([])
+    estmap = {}
 
-        key = line[0].strip()
-        if "Gaussian" in line[1]:
+    for key, value in assignment.findall(text):
+        key = key.strip()
+        if "Gaussian" in value:
             value = 1.0
         else:
-            value = line[1].strip()
+            value = value.strip()
 
         # In legofit output, pairs are printed twice. First as initial
-        # values, and second as estimates. This code adds a pair to
-        # parmap the first time it is seen and to estmap the second
-        # time. Thus, parmap will contain the initial values and
-        # estmap the estimates.
-        if key in parmap:
+        # values, and second as estimates. This code records a key
+        # the first time it is seen and adds the pair to estmap the
+        # second time. Thus, estmap will contain the estimates.
+        if key in seen:
             estmap[key] = value
         else:
-            parmap[key] = value
+            seen.add(key)
 
-    ifile.close()
     return estmap
 
 fnames = []
@@ -118,11 +121,8 @@ while(True):
 if len(fnames) < 1:
     usage("Command line must list at least 1 input file")
 
-print "# flatfile.py run at: %s" % datetime.datetime.now()
-print "# input files:",
-for i in range(len(fnames)):
-    print fnames[i],
-print
+print("# flatfile.py run at: %s" % datetime.datetime.now())
+sys.stdout.write("# input files: " + " ".join(fnames) + "\n")
 
 allmaps = []  # allmaps[i] is the dictionary for file i
 allnames = set([]) # set of all parameter names
@@ -131,52 +131,29 @@ allnames = set([]) # set of all parameter names
 for name in fnames:
     estmap = parselegofit(name)
     if len(estmap) == 0:
-        print >> sys.stderr, "ERR: file %s has no parameters" % name
+        print("ERR: file %s has no parameters" % name, file=sys.stderr)
         sys.exit(1)
     allmaps.append(estmap)
-    allnames |= set(estmap.keys())
+    allnames.update(estmap)
 
-allnames = sorted(list(allnames))
+allnames = sorted(allnames)
 npar = len(allnames)
 nfile = len(fnames)
 
 # mat is a rectangular matrix, with missing parameters set to None.
-mat = nfile*[None]
-for i in range(nfile):
-    mat[i] = [None for j in range(npar)]
-    k = 0
-    for j in range(npar):
-        # If parameter name is in map i, then put the corresponding
-        # value into mat. Otherwise, it retains its initial value of
-        # None.
-        if allnames[j] in allmaps[i]:
-            mat[i][j] = allmaps[i][allnames[j]]
+# Row i holds the values in map i, in the order of allnames.
+mat = [[estmap.get(name) for name in allnames] for estmap in allmaps]
+
+# Convert mat to strings, writing missing values as "NA".
+strmat = [["NA" if val == None else str(val) for val in vals]
+          for vals in mat]
+writer = csv.writer(sys.stdout, delimiter=" ", lineterminator="\n")
 
 if transpose:
-    nrows = npar
-    ncols = len(fnames)
-    print "param",
-    for j in range(ncols):
-        print fnames[j],
-    print
-    for i in range(nrows):
-        print allnames[i],
-        for j in range(ncols):
-            if mat[j][i] == None:
-                print "NA",
-            else:
-                print mat[j][i],
-        print
+    sys.stdout.write("param " + " ".join(fnames) + "\n")
+    writer.writerows([allnames[i]] + list(col)
+                     for i, col in enumerate(zip(*strmat)))
 else:
-    for name in allnames:
-        print "%s" % name,
-    print
-
-    for row in mat:
-        for val in row:
-            if val == None:
-                print "NA",
-            else:
-                print "%s" % val,
-        print
+    sys.stdout.write(" ".join(allnames) + "\n")
 
+    writer.writerows(strmat)